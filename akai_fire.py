@@ -1,6 +1,10 @@
+import queue
 import threading
+import time
 
+import numpy as np
 import rtmidi
+from numba import njit
 
 # Constants
 BITMAP_SIZE: int = 1171  # For OLED 128x64, calculated as ceil(128*64/7)
@@ -15,55 +19,161 @@ BITMAP_PIXEL_MAPPING: list[list[int]] = [
 ]
 
 
+def _build_pixel_lut():
+    """Precompute the packed byte index and bit mask of every OLED pixel.
+
+    Both tables are flat and indexed by y * 128 + x.
+    """
+    index = np.empty(128 * 64, dtype=np.intp)
+    mask = np.empty(128 * 64, dtype=np.uint8)
+    for y in range(64):
+        for x in range(128):
+            xx = x + 128 * (y // 8)
+            rb = BITMAP_PIXEL_MAPPING[xx % 7][y % 8]
+            index[y * 128 + x] = (xx // 7) * 8 + (rb // 7)
+            mask[y * 128 + x] = 1 << (rb % 7)
+    return index, mask
+
+
+BITMAP_INDEX, BITMAP_MASK = _build_pixel_lut()
+
+
+def _build_pack_lut():
+    """Invert the pixel tables: the pixel feeding each bit of each packed byte.
+
+    Bits with no pixel behind them (the tail of the last byte) hold -1.
+    """
+    sources = np.full((BITMAP_SIZE, 7), -1, dtype=np.intp)
+    for pixel in range(128 * 64):
+        bit = int(BITMAP_MASK[pixel]).bit_length() - 1
+        sources[BITMAP_INDEX[pixel], bit] = pixel
+    return sources
+
+
+BITMAP_SOURCES = _build_pack_lut()
+
+OLED_HEADER: bytes = bytes(
+    [
+        0xF0,  # Start of SysEx
+        0x47,  # Manufacturer ID (Akai)
+        0x7F,  # All-Call address
+        0x43,  # Akai Fire product ID
+        0x0E,  # OLED Write command
+        (BITMAP_SIZE + 4) >> 7,  # Payload length (MSB)
+        (BITMAP_SIZE + 4) & 0x7F,  # Payload length (LSB)
+        0,
+        0x07,  # Start and end band
+        0,
+        0x7F,  # Start and end column
+    ]
+)
+OLED_HEADER_SIZE: int = len(OLED_HEADER)
+
+
+@njit(cache=True)
+def _hline(fb, x, y, length, value):
+    if 0 <= y < 64:
+        for xx in range(max(x, 0), min(x + length, 128)):
+            fb[y, xx] = value
+
+
+@njit(cache=True)
+def _vline(fb, x, y, length, value):
+    if 0 <= x < 128:
+        for yy in range(max(y, 0), min(y + length, 64)):
+            fb[yy, x] = value
+
+
+@njit(cache=True)
+def _plot(fb, x, y, value):
+    if 0 <= x < 128 and 0 <= y < 64:
+        fb[y, x] = value
+
+
+@njit(cache=True)
+def _midpoint_circle(fb, x0, y0, radius, value):
+    x = radius
+    y = 0
+    decision_over_2 = 1 - x
+
+    while x >= y:
+        _plot(fb, x0 + x, y0 + y, value)
+        _plot(fb, x0 + y, y0 + x, value)
+        _plot(fb, x0 - y, y0 + x, value)
+        _plot(fb, x0 - x, y0 + y, value)
+        _plot(fb, x0 - x, y0 - y, value)
+        _plot(fb, x0 - y, y0 - x, value)
+        _plot(fb, x0 + y, y0 - x, value)
+        _plot(fb, x0 + x, y0 - y, value)
+        y += 1
+        if decision_over_2 <= 0:
+            decision_over_2 += 2 * y + 1
+        else:
+            x -= 1
+            decision_over_2 += 2 * (y - x) + 1
+
+
+@njit(cache=True)
+def _fill_circle(fb, x0, y0, radius, value):
+    r2 = radius * radius
+    for yy in range(max(y0 - radius, 0), min(y0 + radius + 1, 64)):
+        dy = yy - y0
+        for xx in range(max(x0 - radius, 0), min(x0 + radius + 1, 128)):
+            dx = xx - x0
+            if dx * dx + dy * dy <= r2:
+                fb[yy, xx] = value
+
+
+@njit(cache=True)
+def _pack_bitmap(fb, sources, out):
+    # Each output byte only reads its own seven pixels, no read-modify-write
+    for i in range(out.shape[0]):
+        byte = 0
+        for bit in range(7):
+            pixel = sources[i, bit]
+            if pixel >= 0 and fb[pixel] != 0:
+                byte |= 1 << bit
+        out[i] = byte
+
+
 class AkaiFireBitmap:
     def __init__(self):
-        self.bitmap = [0] * BITMAP_SIZE
+        # 128x64 framebuffer, one byte per pixel; packed only when sent
+        self.fb = np.zeros((64, 128), dtype=np.uint8)
+        # SysEx frame reused for every send, only the payload is rewritten
+        self._frame = bytearray(OLED_HEADER + bytes(BITMAP_SIZE) + bytes([0xF7]))
+        self._payload = np.frombuffer(self._frame, dtype=np.uint8)[OLED_HEADER_SIZE:-1]
+        self.dirty = True  # Changed since it was last sent
 
     def clear(self):
         """Clear the bitmap."""
-        self.bitmap = [0] * BITMAP_SIZE
+        self.dirty = True
+        self.fb.fill(0)
 
     def set_pixel(self, x: int, y: int, color: int):
         """Set a pixel on the OLED display."""
+        self.dirty = True
         if 0 <= x < 128 and 0 <= y < 64:
-            x = x + int(128 * (y // 8))
-            y %= 8
-            rb = BITMAP_PIXEL_MAPPING[int(x % 7)][y]
-            index = int((x // 7) * 8 + (rb // 7))
-            if color > 0:
-                self.bitmap[index] |= 1 << (rb % 7)
-            else:
-                self.bitmap[index] &= ~(1 << (rb % 7))
+            self.fb[int(y), int(x)] = 1 if color > 0 else 0
+
+    def _pack(self):
+        """Pack the bitmap into the reused SysEx frame, overwritten on every call."""
+        _pack_bitmap(self.fb.ravel(), BITMAP_SOURCES, self._payload)
+        return self._frame
 
     def get_sysex_message(self):
-        """Send the bitmap to the Akai Fire device using MIDI SysEx."""
-        chunk_size = BITMAP_SIZE + 4
-        sysex_data = [
-            0xF0,  # Start of SysEx
-            0x47,  # Manufacturer ID (Akai)
-            0x7F,  # All-Call address
-            0x43,  # Akai Fire product ID
-            0x0E,  # OLED Write command
-            chunk_size >> 7,  # Payload length (MSB)
-            chunk_size & 0x7F,  # Payload length (LSB)
-            0,
-            0x07,  # Start and end band
-            0,
-            0x7F,  # Start and end column
-        ]
-        sysex_data.extend(self.bitmap)
-        sysex_data.append(0xF7)  # End of SysEx
-        return sysex_data
+        """Build the OLED SysEx message for the bitmap as a standalone copy."""
+        return bytes(self._pack())
 
     def draw_horizontal_line(self, x: int, y: int, length: int, color: int):
         """Draw a horizontal line."""
-        for i in range(length):
-            self.set_pixel(x + i, y, color)
+        self.dirty = True
+        _hline(self.fb, int(x), int(y), int(length), 1 if color > 0 else 0)
 
     def draw_vertical_line(self, x: int, y: int, length: int, color: int):
         """Draw a vertical line."""
-        for i in range(length):
-            self.set_pixel(x, y + i, color)
+        self.dirty = True
+        _vline(self.fb, int(x), int(y), int(length), 1 if color > 0 else 0)
 
     def draw_rectangle(self, x: int, y: int, width: int, height: int, color: int):
         """Draw a rectangle."""
@@ -74,37 +184,22 @@ class AkaiFireBitmap:
 
     def fill_rectangle(self, x: int, y: int, width: int, height: int, color: int):
         """Fill a rectangle."""
-        for i in range(height):
-            self.draw_horizontal_line(x, y + i, width, color)
+        self.dirty = True
+        x, y, width, height = int(x), int(y), int(width), int(height)
+        x_start, x_end = max(x, 0), min(x + width, 128)
+        y_start, y_end = max(y, 0), min(y + height, 64)
+        if x_start < x_end and y_start < y_end:
+            self.fb[y_start:y_end, x_start:x_end] = 1 if color > 0 else 0
 
     def draw_circle(self, x0: int, y0: int, radius: int, color: int):
         """Draw a circle using the midpoint circle algorithm."""
-        x = radius
-        y = 0
-        decision_over_2 = 1 - x
-
-        while x >= y:
-            self.set_pixel(x0 + x, y0 + y, color)
-            self.set_pixel(x0 + y, y0 + x, color)
-            self.set_pixel(x0 - y, y0 + x, color)
-            self.set_pixel(x0 - x, y0 + y, color)
-            self.set_pixel(x0 - x, y0 - y, color)
-            self.set_pixel(x0 - y, y0 - x, color)
-            self.set_pixel(x0 + y, y0 - x, color)
-            self.set_pixel(x0 + x, y0 - y, color)
-            y += 1
-            if decision_over_2 <= 0:
-                decision_over_2 += 2 * y + 1
-            else:
-                x -= 1
-                decision_over_2 += 2 * (y - x) + 1
+        self.dirty = True
+        _midpoint_circle(self.fb, int(x0), int(y0), int(radius), 1 if color > 0 else 0)
 
     def fill_circle(self, x0: int, y0: int, radius: int, color: int):
         """Fill a circle."""
-        for y in range(-radius, radius + 1):
-            for x in range(-radius, radius + 1):
-                if x**2 + y**2 <= radius**2:
-                    self.set_pixel(x0 + x, y0 + y, color)
+        self.dirty = True
+        _fill_circle(self.fb, int(x0), int(y0), int(radius), 1 if color > 0 else 0)
 
 
 class AkaiFire:
@@ -153,6 +248,9 @@ class AkaiFire:
     RECTANGLE_LED_HIGH_RED = 0x03
     RECTANGLE_LED_HIGH_GREEN = 0x04
 
+    # OLED refresh limit for flush_bitmap
+    BITMAP_MAX_FPS = 60
+
     # todo    temporary
     FIELD_BASE = 0x10  # Base flag, must be set for valid combinations
     FIELD_CHANNEL = 0x01
@@ -196,6 +294,13 @@ class AkaiFire:
         self.rotary_listeners = {}
         self.rotary_touch_listeners = {}
         self.button_listeners = {}
+        self._in_queue = queue.Queue()
+        self._last_bitmap = None  # Last OLED SysEx sent
+        self._blank_bitmap = AkaiFireBitmap()  # Reused by clear_bitmap
+        self._last_bitmap_send = 0.0
+        self._bitmap_lock = threading.Lock()  # Serializes OLED sends
+        self._bitmap_timer = None  # Deferred flush of a rate-limited frame
+        self._pending_bitmap = None
         self.listening_thread = threading.Thread(target=self._listen, daemon=True)
         self.listening = False
 
@@ -219,21 +324,70 @@ class AkaiFire:
     def close(self):
         """Closes the MIDI input and output ports."""
         self.listening = False
+        with self._bitmap_lock:
+            if self._bitmap_timer is not None:
+                self._bitmap_timer.cancel()
+                self._bitmap_timer = None
         if self.listening_thread.is_alive():
             self.listening_thread.join()
+        self.midi_in.cancel_callback()
 
         self.midi_in.close_port()
         self.midi_out.close_port()
 
     def send_bitmap(self, screen):
-        """Send the bitmap to the Akai Fire device."""
-        self.midi_out.send_message(screen.get_sysex_message())
-        pass
+        """
+        Send the bitmap to the Akai Fire device, unless it is already showing.
+        :param screen: The AkaiFireBitmap to send.
+        :return: True if the bitmap was sent.
+        """
+        with self._bitmap_lock:
+            # Cleared before packing, so drawing during the send marks it dirty again
+            screen.dirty = False
+            message = screen._pack()
+            if message == self._last_bitmap:
+                return False
+            self.midi_out.send_message(message)
+            self._last_bitmap = bytes(message)
+            self._last_bitmap_send = time.perf_counter()
+            return True
+
+    def flush_bitmap(self, screen):
+        """
+        Send the bitmap if it changed, at most BITMAP_MAX_FPS times per second.
+        A frame held back by the limit is sent by a timer once the interval is up,
+        so the last drawing of a burst still reaches the display.
+        :param screen: The AkaiFireBitmap to send.
+        :return: True if the bitmap was sent now.
+        """
+        if not screen.dirty:
+            return False
+        wait = self._last_bitmap_send + 1 / self.BITMAP_MAX_FPS - time.perf_counter()
+        if wait > 0:
+            self._defer_bitmap_flush(screen, wait)
+            return False
+        return self.send_bitmap(screen)
+
+    def _defer_bitmap_flush(self, screen, delay):
+        """Flush the latest rate-limited bitmap once the interval is up."""
+        with self._bitmap_lock:
+            self._pending_bitmap = screen
+            if self._bitmap_timer is None:
+                self._bitmap_timer = threading.Timer(delay, self._deferred_flush)
+                self._bitmap_timer.daemon = True
+                self._bitmap_timer.start()
+
+    def _deferred_flush(self):
+        with self._bitmap_lock:
+            screen = self._pending_bitmap
+            self._bitmap_timer = None
+            self._pending_bitmap = None
+        if screen is not None:
+            self.flush_bitmap(screen)
 
     def clear_bitmap(self):
         """Clear the OLED display."""
-        self.send_bitmap(AkaiFireBitmap())
-        pass
+        self.send_bitmap(self._blank_bitmap)
 
     @staticmethod
     def _create_sysex_message(pad_colors):
@@ -491,43 +645,49 @@ class AkaiFire:
         """
         return (pad_index // 16) + 1
 
+    def _on_midi_in(self, event, data=None):
+        """rtmidi callback, hands incoming messages to the listening thread."""
+        self._in_queue.put(event[0])
+
     def _listen(self):
         """Internal method to listen for MIDI messages."""
+        self.midi_in.set_callback(self._on_midi_in)
         while self.listening:
-            message = self.midi_in.get_message()
-            if message:
-                data, _ = message
-                status = data[0]
-                controller = data[1]
-                value = data[2]
-
-                # Handle button press/release events
-                if status in [0x90, 0x80] and controller in self.button_listeners:
-                    event = "press" if status == 0x90 else "release"
-                    self.button_listeners[controller](controller, event)
-
-                # Handle rotary touch events
-                if status in [0x90, 0x80] and controller in self.rotary_touch_listeners:
-                    event = "touch" if status == 0x90 else "release"
-                    self.rotary_touch_listeners[controller](controller, event)
-
-                # Handle rotary turn events
-                if status == 0xB0 and controller in self.rotary_listeners:
-                    # Decode two's complement rotation value
-                    direction = "clockwise" if value < 0x40 else "counterclockwise"
-                    velocity = value if value < 0x40 else (0x80 - value)
-                    self.rotary_listeners[controller](controller, direction, velocity)
-
-                # Check for note_on messages
-                if data[0] == 0x90 and data[2] > 0:  # 0x90 = note_on, velocity > 0
-                    midi_note = data[1]
-                    pad_index = midi_note - 54  # Map MIDI note to pad index
-
-                    if 0 <= pad_index <= 63:
-                        # Trigger specific pad listeners
-                        if pad_index in self.listeners:
-                            self.listeners[pad_index](pad_index)
-
-                        # Trigger global listener
-                        if self.global_listener:
-                            self.global_listener(pad_index)
+            try:
+                data = self._in_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            status = data[0]
+            controller = data[1]
+            value = data[2]
+
+            # Handle button press/release events
+            if status in [0x90, 0x80] and controller in self.button_listeners:
+                event = "press" if status == 0x90 else "release"
+                self.button_listeners[controller](controller, event)
+
+            # Handle rotary touch events
+            if status in [0x90, 0x80] and controller in self.rotary_touch_listeners:
+                event = "touch" if status == 0x90 else "release"
+                self.rotary_touch_listeners[controller](controller, event)
+
+            # Handle rotary turn events
+            if status == 0xB0 and controller in self.rotary_listeners:
+                # Decode two's complement rotation value
+                direction = "clockwise" if value < 0x40 else "counterclockwise"
+                velocity = value if value < 0x40 else (0x80 - value)
+                self.rotary_listeners[controller](controller, direction, velocity)
+
+            # Check for note_on messages
+            if data[0] == 0x90 and data[2] > 0:  # 0x90 = note_on, velocity > 0
+                midi_note = data[1]
+                pad_index = midi_note - 54  # Map MIDI note to pad index
+
+                if 0 <= pad_index <= 63:
+                    # Trigger specific pad listeners
+                    if pad_index in self.listeners:
+                        self.listeners[pad_index](pad_index)
+
+                    # Trigger global listener
+                    if self.global_listener:
+                        self.global_listener(pad_index)
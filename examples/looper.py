@@ -1,20 +1,68 @@
+import heapq
+import logging
+import os
+import threading
 import time
-from dataclasses import dataclass
+from collections import deque
+from dataclasses import dataclass, field
 from typing import List, Optional, Tuple
 
+import numpy as np
 import rtmidi
 
 from akai_fire import AkaiFire
 
+logger = logging.getLogger(__name__)
+
+# Clip row pad colors, indexed by clip state
+CLIP_EMPTY, CLIP_RECORDING, CLIP_PLAYING, CLIP_STOPPED = range(4)
+CLIP_COLORS = np.array(
+    [
+        (10, 10, 10),  # Empty: dim white
+        (127, 0, 0),  # Recording: red
+        (0, 127, 0),  # Playing: bright green
+        (0, 0, 127),  # Has content: blue
+    ],
+    dtype=np.uint8,
+)
+
+# Step row pad colors: dim gray steps, with beat markers while playing
+STEP_COLORS_IDLE = np.full((16, 3), 20, dtype=np.uint8)
+STEP_COLORS = STEP_COLORS_IDLE.copy()
+STEP_COLORS[::4] = (64, 64, 64)  # Medium gray on every beat (4 steps per beat)
+STEP_CURRENT_COLOR = (127, 127, 0)  # Yellow for current step
+
 
 @dataclass
 class Clip:
-    midi_messages: List[Tuple[float, List[int]]]
+    midi_messages: List[Tuple[int, List[int]]]  # As recorded, ns offsets
     is_playing: bool = False
     is_recording: bool = False
-    start_time: Optional[float] = None
+    start_ns: Optional[int] = None
     length: float = 4.0
+    duration_ns: int = 0  # length in ns at the current BPM
     quantize_start: bool = True
+    # Quantized playback events as parallel arrays, sorted by timestamp
+    timestamps: np.ndarray = field(default_factory=lambda: np.empty(0, np.int64))
+    messages: List[List[int]] = field(default_factory=list)
+    next_idx: int = 0  # Cursor into timestamps/messages
+    last_position: int = -1  # Loop position played up to, in ns
+
+
+# Formatters indexed by the status byte's high nibble, called with
+# (channel, data1, data2); None for data bytes and system messages
+_DECODERS = [None] * 16
+_DECODERS[0x8] = lambda ch, d1, d2: f"Note Off: ch{ch} note={d1} vel={d2}"
+_DECODERS[0x9] = lambda ch, d1, d2: (
+    f"Note Off: ch{ch} note={d1} (vel=0)"  # Note On with velocity 0 is Note Off
+    if d2 == 0
+    else f"Note On: ch{ch} note={d1} vel={d2}"
+)
+_DECODERS[0xA] = lambda ch, d1, d2: f"Aftertouch: ch{ch} note={d1} val={d2}"
+_DECODERS[0xB] = lambda ch, d1, d2: f"CC: ch{ch} ctrl={d1} val={d2}"
+_DECODERS[0xC] = lambda ch, d1, d2: f"Program Change: ch{ch} program={d1}"
+_DECODERS[0xD] = lambda ch, d1, d2: f"Channel Pressure: ch{ch} val={d1}"
+_DECODERS[0xE] = lambda ch, d1, d2: f"Pitch Bend: ch{ch} val={(d2 << 7) + d1}"
 
 
 def decode_midi_message(message: List[int]) -> str:
@@ -22,28 +70,14 @@ def decode_midi_message(message: List[int]) -> str:
     if not message:
         return "Empty message"
 
-    status = message[0] & 0xF0
-    channel = message[0] & 0x0F
-
-    if status == 0x80:  # Note Off
-        return f"Note Off: ch{channel + 1} note={message[1]} vel={message[2]}"
-    elif status == 0x90:  # Note On
-        if message[2] == 0:  # Note On with velocity 0 is Note Off
-            return f"Note Off: ch{channel + 1} note={message[1]} (vel=0)"
-        return f"Note On: ch{channel + 1} note={message[1]} vel={message[2]}"
-    elif status == 0xB0:  # Control Change
-        return f"CC: ch{channel + 1} ctrl={message[1]} val={message[2]}"
-    elif status == 0xE0:  # Pitch Bend
-        value = (message[2] << 7) + message[1]
-        return f"Pitch Bend: ch{channel + 1} val={value}"
-    elif status == 0xA0:  # Aftertouch
-        return f"Aftertouch: ch{channel + 1} note={message[1]} val={message[2]}"
-    elif status == 0xD0:  # Channel Pressure
-        return f"Channel Pressure: ch{channel + 1} val={message[1]}"
-    elif status == 0xC0:  # Program Change
-        return f"Program Change: ch{channel + 1} program={message[1]}"
-    else:
+    decoder = _DECODERS[message[0] >> 4]
+    if decoder is None:
         return f"Unknown: {' '.join(hex(b)[2:].zfill(2) for b in message)}"
+    return decoder(
+        (message[0] & 0x0F) + 1,
+        message[1] if len(message) > 1 else 0,
+        message[2] if len(message) > 2 else 0,
+    )
 
 
 class MidiLooper:
@@ -60,17 +94,43 @@ class MidiLooper:
         self.midi_out = rtmidi.MidiOut()
         self._setup_midi()
 
+        # Incoming MIDI is timestamped on arrival by rtmidi's callback thread
+        self._in_queue = deque(maxlen=1024)
+        self.midi_in.set_callback(self._on_midi_in)
+
+        # Playback is scheduled slightly ahead and sent by a dispatcher thread,
+        # so jitter in the main loop does not reach the MIDI output
+        self._lookahead_ns = 10_000_000
+        self._schedule = []  # heap of (fire_at, seq, clip_idx, message)
+        self._schedule_seq = 0
+        self._schedule_cv = threading.Condition()
+        self._dispatching = False
+        self._dispatch_thread = threading.Thread(
+            target=self._dispatch_loop, daemon=True
+        )
+        self._active_channels = set()  # Channels with notes sent or recorded
+        self._notes_off_pending = False  # All Notes Off for the dispatcher to send
+
         # Track global playback state
-        self.global_start_time = None  # Reference time for all clips
+        self.global_start_ns = None  # Reference time for all clips
+        self._earliest_playing_start = None  # Start of the earliest playing clip
         self.current_bar = 0
         self.current_step = 0
-        self.last_step_time = 0
+        self.last_step_ns = 0
 
         # Just track 1 for now (16 clips)
-        self.clips = {clip: None for clip in range(16)}
+        self.clips: List[Optional[Clip]] = [None] * 16
         self.recording_clip = None  # clip index or None
         self.pending_record = None  # clip waiting for quantized start
 
+        # Pad colors last sent for the first two rows, so only changes go out
+        self._prev_colors = np.zeros((32, 3), dtype=np.uint8)
+        # State changes only mark the pads dirty, the main loop redraws them
+        # at most once per display frame
+        self._display_dirty = True
+        self._display_interval_ns = 16_666_667  # 60 Hz
+        self._last_display_ns = 0
+
         self._setup_controls()
         self._init_display()
         print("Initialization complete")
@@ -116,20 +176,17 @@ class MidiLooper:
         self.steps_per_beat = 4  # 16th notes
         self.total_steps = self.beats_per_bar * self.steps_per_beat
 
-        self.beat_duration = 60.0 / self.bpm
-        self.bar_duration = self.beat_duration * self.beats_per_bar
-        self.step_duration = self.beat_duration / self.steps_per_beat
-        self.beats_per_bar = 4
-        self.steps_per_beat = 4  # 16th notes
-        self.total_steps = self.beats_per_bar * self.steps_per_beat
+        # Integer nanosecond grid used by the playback clock
+        self.step_ns = int(60e9 / self.bpm) // self.steps_per_beat
+        self.bar_ns = self.step_ns * self.total_steps
 
-    def _get_quantized_time(self, current_time: float) -> float:
+    def _get_quantized_time(self, current_ns: int) -> int:
         """Get the next quantized time (start of next bar)."""
-        if self.global_start_time is None:
-            return current_time
+        if self.global_start_ns is None:
+            return current_ns
 
-        time_in_loop = (current_time - self.global_start_time) % self.bar_duration
-        next_bar_time = current_time + (self.bar_duration - time_in_loop)
+        time_in_loop = (current_ns - self.global_start_ns) % self.bar_ns
+        next_bar_time = current_ns + (self.bar_ns - time_in_loop)
         return next_bar_time
 
     def _handle_bpm(self, encoder_id: int, direction, velocity):
@@ -143,6 +200,9 @@ class MidiLooper:
         # Limit BPM to 30-300 range
         self.bpm = max(30.0, min(300.0, self.bpm + diff))
         self._update_timing_params()
+        for clip in self.clips:
+            if clip:
+                clip.duration_ns = int(clip.length * self.bar_ns)
         print(f"BPM: {self.bpm:.1f}")
 
     def _handle_pad(self, pad_index: int):
@@ -150,24 +210,26 @@ class MidiLooper:
         if pad_index >= 16:  # Only handle first row
             return
 
-        current_time = time.time()
+        current_ns = time.perf_counter_ns()
         print(f"Pad pressed: clip {pad_index}")
 
         if self.clips[pad_index] is None:
             # Empty slot - arm for recording
             print(f"Armed clip {pad_index}")
-            self.clips[pad_index] = Clip(midi_messages=[])
+            clip = Clip(midi_messages=[])
+            clip.duration_ns = int(clip.length * self.bar_ns)
+            self.clips[pad_index] = clip
 
-            if self.global_start_time is None:
+            if self.global_start_ns is None:
                 # First clip - start immediately
                 self.recording_clip = pad_index
-                self.clips[pad_index].start_time = current_time
-                self.global_start_time = current_time
+                self.clips[pad_index].start_ns = current_ns
+                self.global_start_ns = current_ns
             else:
                 # Queue recording to start at next bar
                 self.pending_record = pad_index
-                next_start = self._get_quantized_time(current_time)
-                self.clips[pad_index].start_time = next_start
+                next_start = self._get_quantized_time(current_ns)
+                self.clips[pad_index].start_ns = next_start
 
             self.fire.set_button_led(self.fire.BUTTON_REC, self.fire.LED_HIGH_RED)
 
@@ -180,19 +242,35 @@ class MidiLooper:
                 clip.is_playing = not clip.is_playing
 
                 if clip.is_playing:
-                    if self.global_start_time is None:
+                    clip.next_idx = 0
+                    clip.last_position = -1
+                    if self.global_start_ns is None:
                         # First clip playing - set global time reference
-                        self.global_start_time = current_time
-                        clip.start_time = current_time
+                        self.global_start_ns = current_ns
+                        clip.start_ns = current_ns
                     else:
                         # Quantize start to next bar
-                        clip.start_time = self._get_quantized_time(current_time)
+                        clip.start_ns = self._get_quantized_time(current_ns)
                     print(f"Started clip {pad_index}")
                 else:
-                    self._all_notes_off()  # Stop any hanging notes
+                    with self._schedule_cv:
+                        self._cancel_scheduled(pad_index)
+                        self._request_all_notes_off()  # Stop any hanging notes
                     print(f"Stopped clip {pad_index}")
+                self._recompute_earliest_start()
 
-        self._update_display()
+        self._display_dirty = True
+
+    def _recompute_earliest_start(self):
+        """Cache the earliest start time of the playing clips."""
+        self._earliest_playing_start = min(
+            (
+                clip.start_ns
+                for clip in self.clips
+                if clip and clip.is_playing and clip.start_ns is not None
+            ),
+            default=None,
+        )
 
     def _handle_rec(self, button_id: int, event: str):
         """Record button starts/stops recording of armed clip."""
@@ -211,38 +289,44 @@ class MidiLooper:
                 clip.is_recording = False
 
                 # Quantize recorded MIDI to steps
-                quantized_messages = []
-                for timestamp, message in clip.midi_messages:
-                    # Quantize to nearest step
-                    step = round(timestamp / self.step_duration)
-                    quantized_time = step * self.step_duration
-
-                    # Only keep messages within clip length
-                    if quantized_time < clip.length * self.bar_duration:
-                        quantized_messages.append((quantized_time, message))
+                timestamps = np.fromiter(
+                    (timestamp for timestamp, _ in clip.midi_messages),
+                    dtype=np.int64,
+                    count=len(clip.midi_messages),
+                )
+                steps = np.round(timestamps / self.step_ns).astype(np.int64)
+                quantized = steps * self.step_ns
 
-                clip.midi_messages = sorted(quantized_messages)
+                # Only keep messages within clip length, in time order
+                keep = np.flatnonzero(quantized < clip.duration_ns)
+                order = keep[np.argsort(quantized[keep], kind="stable")]
+                clip.timestamps = quantized[order]
+                clip.messages = [clip.midi_messages[i][1] for i in order]
 
             print(f"Stopped recording clip {self.recording_clip}")
             self.recording_clip = None
             self.fire.set_button_led(self.fire.BUTTON_REC, self.fire.LED_OFF)
-            self._update_display()
+            self._display_dirty = True
 
     def _handle_stop(self, button_id: int, event: str):
         """Stop all clips, recording, and reset global timing."""
         if event == "press":
             print("Stopping all clips")
-            self._all_notes_off()
+            with self._schedule_cv:
+                # Stop the clips before cancelling, so the main loop cannot
+                # schedule more notes behind the All Notes Off
+                for clip in self.clips:
+                    if clip:
+                        clip.is_playing = False
+                        clip.start_ns = None
+                self.global_start_ns = None
+                self._recompute_earliest_start()
+                self._cancel_scheduled()
+                self._request_all_notes_off()
 
-            self.global_start_time = None
             self.current_bar = 0
             self.current_step = 0
 
-            for clip in self.clips.values():
-                if clip:
-                    clip.is_playing = False
-                    clip.start_time = None
-
             if self.recording_clip is not None:
                 clip = self.clips[self.recording_clip]
                 if not clip.midi_messages:
@@ -251,162 +335,242 @@ class MidiLooper:
 
             self.pending_record = None
             self.fire.set_button_led(self.fire.BUTTON_REC, self.fire.LED_OFF)
-            self._update_display()
+            self._display_dirty = True
+
+    def _request_all_notes_off(self):
+        """Have the dispatcher send All Notes Off after any message in flight."""
+        with self._schedule_cv:
+            self._notes_off_pending = True
+            self._schedule_cv.notify()
 
     def _all_notes_off(self):
-        """Send note off messages for all notes."""
-        for note in range(128):
-            self.midi_out.send_message([0x80, note, 0])
+        """Send All Notes Off (CC 123) on every channel that played notes."""
+        for channel in sorted(self._active_channels) or range(16):
+            self.midi_out.send_message([0xB0 | channel, 123, 0])
+        self._active_channels.clear()
+        self._notes_off_pending = False
 
     def _init_display(self):
         """Initialize display state."""
         print("Initializing display...")
         self.fire.clear_all_pads()
         self.fire.clear_all_button_leds()
+        self._prev_colors.fill(255)  # Force a full refresh
         self._update_display()
 
     def _update_display(self):
         """Update pad colors based on clip states and playback position."""
-        colors = []
+        colors = np.empty((32, 3), dtype=np.uint8)
 
         # First row: Clip states
-        for clip_idx in range(16):
-            clip = self.clips.get(clip_idx)
-
+        states = []
+        for clip_idx, clip in enumerate(self.clips):
             if clip is None:
-                color = (10, 10, 10)  # Empty: dim white
+                states.append(CLIP_EMPTY)
             elif clip_idx == self.recording_clip:
-                color = (127, 0, 0)  # Recording: red
+                states.append(CLIP_RECORDING)
             elif clip.is_playing:
-                color = (0, 127, 0)  # Playing: bright green
+                states.append(CLIP_PLAYING)
             else:
-                color = (0, 0, 127)  # Has content: blue
-
-            colors.append((clip_idx, *color))
+                states.append(CLIP_STOPPED)
+        colors[:16] = CLIP_COLORS[states]
 
         # Second row: Playback position
-        any_playing = any(clip and clip.is_playing for clip in self.clips.values())
-        if any_playing:
-            current_time = time.time()
-            # Find the earliest start time of playing clips
-            start_time = min(
-                (
-                    clip.start_time
-                    for clip in self.clips.values()
-                    if clip and clip.is_playing and clip.start_time is not None
-                )
-            )
-            elapsed = current_time - start_time
+        start_ns = self._earliest_playing_start
+        if start_ns is not None:
+            current_ns = time.perf_counter_ns()
+            elapsed = current_ns - start_ns
 
             # Calculate position
-            total_steps = self.beats_per_bar * self.steps_per_beat
-            step_duration = self.beat_duration / self.steps_per_beat
-            current_step = int(
-                (elapsed % (self.beats_per_bar * self.beat_duration)) / step_duration
-            )
-            current_bar = int(elapsed / (self.beats_per_bar * self.beat_duration))
+            current_step = (elapsed % self.bar_ns) // self.step_ns
+            current_bar = elapsed // self.bar_ns
 
             # Update step indicators (pads 16-31)
-            for step in range(16):
-                pad_idx = step + 16  # Second row
-                if step == current_step:
-                    color = (127, 127, 0)  # Yellow for current step
-                elif step % self.steps_per_beat == 0:
-                    color = (64, 64, 64)  # Medium gray for beat markers
-                else:
-                    color = (20, 20, 20)  # Dim gray for other steps
-                colors.append((pad_idx, *color))
+            colors[16:32] = STEP_COLORS
+            colors[16 + current_step] = STEP_CURRENT_COLOR
 
             # Show current bar number on the last pad
-            print(f"Bar: {current_bar + 1}")
+            logger.debug("Bar: %d", current_bar + 1)
         else:
             # No clips playing - dim all step indicators
-            for step in range(16):
-                colors.append((step + 16, 20, 20, 20))
+            colors[16:32] = STEP_COLORS_IDLE
 
-        self.fire.set_multiple_pad_colors(colors)
+        # Only send the pads that changed since the last update
+        changed = np.flatnonzero((colors != self._prev_colors).any(axis=1))
+        if changed.size:
+            self.fire.set_multiple_pad_colors(
+                [(i, *colors[i].tolist()) for i in changed.tolist()]
+            )
+            self._prev_colors = colors
+
+    def _on_midi_in(self, event, data=None):
+        """rtmidi callback, queues the message with its arrival time."""
+        self._in_queue.append((time.perf_counter_ns(), event[0]))
 
     def _process_midi(self):
         """Handle MIDI input/output with improved timing."""
-        current_time = time.time()
+        current_ns = time.perf_counter_ns()
 
         # Check for pending recording start
         if self.pending_record is not None:
             clip = self.clips[self.pending_record]
-            if current_time >= clip.start_time:
+            if current_ns >= clip.start_ns:
                 self.recording_clip = self.pending_record
                 self.pending_record = None
                 print(f"Starting quantized recording of clip {self.recording_clip}")
+                self._display_dirty = True
 
         # Record incoming MIDI
-        if self.recording_clip is not None:
+        while self._in_queue:
+            arrived_ns, midi_data = self._in_queue.popleft()
+            if self.recording_clip is None:
+                continue  # Not recording, drop it
             clip = self.clips[self.recording_clip]
-            message = self.midi_in.get_message()
-
-            if message:
-                midi_data, delta = message
-                if not clip.is_recording:
-                    clip.is_recording = True
-                    print("Recording started")
-
-                # Store message with timestamp relative to clip start
-                timestamp = current_time - clip.start_time
-                if (
-                    timestamp < clip.length * self.bar_duration
-                ):  # Only record within clip length
-                    clip.midi_messages.append((timestamp, midi_data))
-                    print(
-                        f"Recorded MIDI: {decode_midi_message(midi_data)} at {timestamp:.3f}s"
+
+            # Store message with timestamp relative to clip start
+            timestamp = arrived_ns - clip.start_ns
+            if timestamp < 0:
+                continue  # Arrived before the quantized start
+            if not clip.is_recording:
+                clip.is_recording = True
+                print("Recording started")
+
+            if timestamp < clip.duration_ns:  # Only record within clip length
+                clip.midi_messages.append((timestamp, midi_data))
+                if midi_data[0] & 0xE0 == 0x80:  # Note Off / Note On
+                    self._active_channels.add(midi_data[0] & 0x0F)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(
+                        "Recorded MIDI: %s at %.3fs",
+                        decode_midi_message(midi_data),
+                        timestamp / 1e9,
                     )
-                else:
-                    self._stop_recording()
+            else:
+                self._stop_recording()
 
         # Update global timing
-        if self.global_start_time is not None:
-            elapsed = current_time - self.global_start_time
-            new_step = int((elapsed % self.bar_duration) / self.step_duration)
+        global_start_ns = self.global_start_ns  # Cleared by STOP on another thread
+        if global_start_ns is not None:
+            elapsed = current_ns - global_start_ns
+            new_step = (elapsed % self.bar_ns) // self.step_ns
 
             if new_step != self.current_step:
                 self.current_step = new_step
-                self.last_step_time = current_time
-                self._update_display()  # Update step indicators
+                self.last_step_ns = current_ns
+                self._display_dirty = True  # Update step indicators
 
             # Calculate current bar
-            self.current_bar = int(elapsed / self.bar_duration)
+            self.current_bar = elapsed // self.bar_ns
 
-        # Handle playback with improved timing
-        for clip_idx, clip in self.clips.items():
-            if clip and clip.is_playing and clip.start_time is not None:
+        # Schedule playback up to the lookahead horizon
+        horizon = current_ns + self._lookahead_ns
+        for clip_idx, clip in enumerate(self.clips):
+            start_ns = clip.start_ns if clip else None
+            if clip and clip.is_playing and start_ns is not None:
                 # Calculate position in clip considering quantization
-                elapsed = current_time - clip.start_time
-                clip_duration = clip.length * self.bar_duration
+                elapsed = horizon - start_ns
+                if elapsed < 0:
+                    continue  # Quantized start not reached yet
+                clip_duration = clip.duration_ns
                 position = elapsed % clip_duration
+                loop_start = horizon - position
 
-                # Play any messages at current position with timing window
-                timing_window = 0.001  # 1ms window
-                for timestamp, message in clip.midi_messages:
-                    # Adjust timestamp for loop position
-                    adjusted_time = timestamp % clip_duration
+                # Schedule every message passed since the last tick
+                if position < clip.last_position:
+                    # Wrapped around, finish the previous pass first
+                    self._schedule_until(
+                        clip_idx, clip, clip_duration, loop_start - clip_duration
+                    )
+                    clip.next_idx = 0
+                self._schedule_until(clip_idx, clip, position, loop_start)
+                clip.last_position = position
+
+        # Redraw the pads at most once per display frame
+        if (
+            self._display_dirty
+            and current_ns - self._last_display_ns >= self._display_interval_ns
+        ):
+            self._display_dirty = False
+            self._last_display_ns = current_ns
+            self._update_display()
 
-                    # Check if message should play in current window
-                    if abs(adjusted_time - position) < timing_window:
-                        self.midi_out.send_message(message)
-                        print(
-                            f"Played from clip {clip_idx}: {decode_midi_message(message)}"
-                        )
+    def _schedule_until(
+        self, clip_idx: int, clip: Clip, position: int, loop_start: int
+    ):
+        """Queue the clip's messages from its cursor up to position."""
+        end = int(np.searchsorted(clip.timestamps, position, side="right"))
+        if end <= clip.next_idx:
+            return
+        timestamps = clip.timestamps[clip.next_idx : end].tolist()
+        messages = clip.messages[clip.next_idx : end]
+        debug = logger.isEnabledFor(logging.DEBUG)
+        with self._schedule_cv:
+            if not clip.is_playing:
+                return  # Stopped since the main loop checked it
+            for timestamp, message in zip(timestamps, messages):
+                heapq.heappush(
+                    self._schedule,
+                    (loop_start + timestamp, self._schedule_seq, clip_idx, message),
+                )
+                self._schedule_seq += 1
+                if message[0] & 0xE0 == 0x80:  # Note Off / Note On
+                    self._active_channels.add(message[0] & 0x0F)
+                if debug:
+                    logger.debug(
+                        "Played from clip %d: %s",
+                        clip_idx,
+                        decode_midi_message(message),
+                    )
+            self._schedule_cv.notify()
+        clip.next_idx = end
+
+    def _cancel_scheduled(self, clip_idx: Optional[int] = None):
+        """Drop queued messages for one clip, or for all clips."""
+        with self._schedule_cv:
+            if clip_idx is None:
+                self._schedule.clear()
+            else:
+                self._schedule = [e for e in self._schedule if e[2] != clip_idx]
+                heapq.heapify(self._schedule)
+
+    def _dispatch_loop(self):
+        """Send queued messages at their scheduled time."""
+        while self._dispatching:
+            with self._schedule_cv:
+                if self._notes_off_pending:
+                    # Sent from this thread, so it follows the last message sent
+                    self._all_notes_off()
+                    continue
+                if not self._schedule:
+                    self._schedule_cv.wait(0.1)
+                    continue
+                fire_at, _, _, message = self._schedule[0]
+                delay = fire_at - time.perf_counter_ns()
+                if delay > 500_000:
+                    # Woken early if an earlier message is queued meanwhile
+                    self._schedule_cv.wait((delay - 500_000) / 1e9)
+                    continue
+                heapq.heappop(self._schedule)
+
+            # Spin the last half millisecond for accuracy
+            while time.perf_counter_ns() < fire_at:
+                pass
+            self.midi_out.send_message(message)
 
     def run(self):
         """Main loop."""
         print("Starting looper...")
+        self._dispatching = True
+        self._dispatch_thread.start()
         try:
-            target_interval = 0.001  # 1ms target interval
+            target_interval = 0.002  # Playback is scheduled ahead, 2ms is enough
             while True:
-                loop_start = time.time()
+                loop_start = time.perf_counter()
 
                 self._process_midi()
 
                 # Calculate sleep time to maintain consistent timing
-                elapsed = time.time() - loop_start
+                elapsed = time.perf_counter() - loop_start
                 sleep_time = max(0, target_interval - elapsed)
                 time.sleep(sleep_time)
 
@@ -414,14 +578,25 @@ class MidiLooper:
             print("Shutting down...")
         finally:
             print("Cleaning up...")
-            self._all_notes_off()
+            self._dispatching = False
+            self._dispatch_thread.join()
+            self._cancel_scheduled()
+            # Notes played since the last notes-off, or one still pending
+            if self._active_channels or self._notes_off_pending:
+                self._all_notes_off()
             self.fire.clear_all_pads()
             self.fire.clear_all_button_leds()
+            self.midi_in.cancel_callback()
             self.midi_in.close_port()
             self.midi_out.close_port()
             self.fire.close()
 
 
 if __name__ == "__main__":
+    # Per-event MIDI logging is off unless LOOPER_DEBUG is set
+    logging.basicConfig(
+        level=logging.DEBUG if os.environ.get("LOOPER_DEBUG") else logging.INFO,
+        format="%(message)s",
+    )
     looper = MidiLooper(bpm=120)
     looper.run()
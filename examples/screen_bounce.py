@@ -45,7 +45,7 @@ def main(duration=10):
             bitmap.fill_circle(x, y, radius, 1)
 
             # Send the updated bitmap to the device
-            fire.send_bitmap(bitmap)
+            fire.flush_bitmap(bitmap)
 
             # Update ball position
             x += dx
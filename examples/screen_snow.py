@@ -30,7 +30,7 @@ def tv_snow(duration=10, fps=30):
                     bitmap.set_pixel(x, y, 1)
 
         # Send the updated bitmap to the device
-        fire.send_bitmap(bitmap)
+        fire.flush_bitmap(bitmap)
 
         # Pause to control frame rate
         time.sleep(1 / fps)
@@ -1,21 +1,15 @@
 import colorsys
 import math
+import queue
 import time
-from dataclasses import dataclass
 from pprint import pprint
-from threading import Thread, Lock
-from typing import List
 
+import numpy as np
 import rtmidi
+from numba import njit
 
-
-@dataclass
-class Droplet:
-    x: float
-    y: float
-    age: float
-    intensity: float
-    impact: float
+# Capacity of the droplet arrays
+MAX_DROPLETS = 128
 
 
 def find_fire_ports():
@@ -35,44 +29,89 @@ def find_fire_ports():
 
 
 class SmoothedValue:
-    def __init__(self, initial_value: float, smoothing: float = 0.15):
+    """Critically damped glide toward a target, stepped once per frame.
+
+    Velocity carries over when the target changes mid-glide, so fast encoder
+    turns bend the motion instead of restarting it.
+    """
+
+    def __init__(self, initial_value: float, dt: float, tau: float = 0.15):
         self.current = initial_value
         self.target = initial_value
-        self.smoothing = smoothing
+        self.velocity = 0.0
+        self.dt = dt
+        self.wn = 2 * math.pi / tau
+        self._decay = math.exp(-self.wn * dt)
 
     def update(self):
-        if abs(self.current - self.target) > 0.0001:
-            self.current += (self.target - self.current) * self.smoothing
+        # Exact step of x'' + 2*wn*x' + wn^2*x = 0, stable for any frame time
+        offset = self.current - self.target
+        drive = (self.velocity + self.wn * offset) * self.dt
+        self.current = self.target + (offset + drive) * self._decay
+        self.velocity = (self.velocity - self.wn * drive) * self._decay
         return self.current
 
     def set_target(self, value: float):
         self.target = value
 
 
-def create_pad_sysex(pad_colors):
-    sysex_header = [0xF0, 0x47, 0x7F, 0x43, 0x65]
-    length = len(pad_colors) * 4
-    length_high = (length >> 7) & 0x7F
-    length_low = length & 0x7F
+@njit(cache=True, fastmath=True)
+def _fast_sin(x):
+    """Polynomial sine, plenty accurate for pad brightness (error < 2e-4)."""
+    # Reduce to [-pi, pi], then fold onto [-pi/2, pi/2]
+    x -= round(x * 0.15915494) * 6.2831853
+    if x > 1.5707963:
+        x = 3.1415927 - x
+    elif x < -1.5707963:
+        x = -3.1415927 - x
+    x2 = x * x
+    return x * (1.0 + x2 * (-0.16605 + x2 * 0.00761))
+
+
+@njit(cache=True, fastmath=True)
+def _ripple_kernel(src, ages, strength, freq, dist_lut, falloff_lut, out):
+    """Accumulate the ripple of every droplet into the 64 pad intensities."""
+    for d in range(src.size):
+        phase = ages[d] * 4.0
+        distance = dist_lut[src[d]]
+        falloff = falloff_lut[src[d]]
+        for pad in range(64):
+            ripple = _fast_sin(distance[pad] * freq - phase) * 0.5 + 0.5
+            out[pad] += strength[d] * ripple * falloff[pad]
+
+
+# Reused pad SysEx frame: 7 header bytes, up to 64 pads of 4 bytes, 0xF7
+_SYSEX_BUF = bytearray(7 + 64 * 4 + 1)
+_SYSEX_BUF[0:5] = bytes([0xF0, 0x47, 0x7F, 0x43, 0x65])
+
+
+def _finish_pad_sysex(buf: bytearray, length: int) -> bytes:
+    """Fill in the payload length and terminator, return the used frame."""
+    buf[5] = (length >> 7) & 0x7F
+    buf[6] = length & 0x7F
+    buf[7 + length] = 0xF7
+    return bytes(memoryview(buf)[: 8 + length])
+
 
-    payload = []
+def create_pad_sysex_bytes(payload: bytes, buf: bytearray = _SYSEX_BUF) -> bytes:
+    """Wrap a packed (index, R, G, B) pad payload in the pad color SysEx."""
+    buf[7 : 7 + len(payload)] = payload
+    return _finish_pad_sysex(buf, len(payload))
+
+
+def create_pad_sysex(pad_colors, buf: bytearray = _SYSEX_BUF) -> bytes:
+    off = 7
     for index, red, green, blue in pad_colors:
-        payload.extend(
-            [
-                index & 0x3F,
-                red & 0x7F,
-                green & 0x7F,
-                blue & 0x7F,
-            ]
-        )
-    return sysex_header + [length_high, length_low] + payload + [0xF7]
-
-
-def create_tap_droplet(pad_index: int, velocity: int) -> Droplet:
-    """Create a droplet from a pad tap"""
-    x = pad_index % 16
-    y = pad_index // 16
+        buf[off] = index & 0x3F
+        buf[off + 1] = red & 0x7F
+        buf[off + 2] = green & 0x7F
+        buf[off + 3] = blue & 0x7F
+        off += 4
+    return _finish_pad_sysex(buf, off - 7)
+
 
+def tap_impact(pad_index: int, velocity: int) -> float:
+    """Scale a pad tap's velocity to the impact of its droplet"""
     # Scale velocity to impact (32 is min velocity on Fire, max is 127)
     # Linear mapping from [32, 127] to [0.25, 2.0]
     if velocity == 127:
@@ -83,10 +122,52 @@ def create_tap_droplet(pad_index: int, velocity: int) -> Droplet:
     print(
         f"Pad {pad_index} tapped with velocity {velocity}, creating droplet with impact {scaled_impact}"
     )
-    return Droplet(x=x, y=y, age=0, intensity=1.0, impact=scaled_impact)
+    return scaled_impact
 
 
 class DropletAnimation:
+    # Solo button -> debug lane
+    SOLO_BUTTONS = {
+        0x24: 0,  # SOLO_1 -> lane 0
+        0x25: 1,  # SOLO_2 -> lane 1
+        0x26: 2,  # SOLO_3 -> lane 2
+        0x27: 3,  # SOLO_4 -> lane 3
+    }
+
+    # Encoder CC -> parameter name
+    ENCODER_MAP = {
+        0x10: "volume",
+        0x11: "pan",
+        0x12: "filter",
+        0x13: "resonance",
+    }
+
+    # Every button and track LED cleared by clear_all_leds, solo buttons last
+    LED_CCS = (
+        # Track LEDs (the narrow LEDs between solo buttons and pads)
+        0x28,
+        0x29,
+        0x2A,
+        0x2B,
+        # Transport buttons (PLAY, STOP, REC)
+        0x33,
+        0x34,
+        0x35,
+        # Other function buttons (STEP, NOTE, DRUM, etc.)
+        0x2C,
+        0x2D,
+        0x2E,
+        0x2F,
+        0x30,
+        0x31,
+        0x32,
+        # Pattern navigation buttons (PAT UP/DOWN, GRID LEFT/RIGHT)
+        0x1F,
+        0x20,
+        0x22,
+        0x23,
+    ) + tuple(SOLO_BUTTONS)
+
     def __init__(self):
         self.midi_in, self.midi_out, in_port, out_port = find_fire_ports()
         if in_port is None or out_port is None:
@@ -95,25 +176,17 @@ class DropletAnimation:
         self.midi_out.open_port(out_port)
         self.midi_in.open_port(in_port)
 
-        # Smoothed animation parameters
-        self.wave_frequency = SmoothedValue(1.0)  # Volume encoder (0.5 to 8.0)
-        self.color_hue = SmoothedValue(0.66)  # Pan encoder (0.0 to 1.0)
-        self.radius_multiplier = SmoothedValue(1.0)  # Filter encoder (0.5 to 6.0)
-        self.age_decay = SmoothedValue(0.05)  # Resonance encoder (0.05 to 2.0)
-
         # Fixed animation frame rate
         self.frame_rate = 0.03  # ~30fps
 
-        self.debug_lanes = set()
-        self.solo_buttons = {
-            0x24: 0,  # SOLO_1 -> lane 0
-            0x25: 1,  # SOLO_2 -> lane 1
-            0x26: 2,  # SOLO_3 -> lane 2
-            0x27: 3,  # SOLO_4 -> lane 3
-        }
+        # Smoothed animation parameters
+        dt = self.frame_rate
+        self.wave_frequency = SmoothedValue(1.0, dt)  # Volume encoder (0.5 to 8.0)
+        self.color_hue = SmoothedValue(0.66, dt)  # Pan encoder (0.0 to 1.0)
+        self.radius_multiplier = SmoothedValue(1.0, dt)  # Filter encoder (0.5 to 6.0)
+        self.age_decay = SmoothedValue(0.05, dt)  # Resonance encoder (0.05 to 2.0)
 
-        # Clear all LEDs on startup
-        self.clear_all_leds()
+        self.debug_lanes = set()
 
         self.encoder_touched = {
             "volume": False,
@@ -122,45 +195,62 @@ class DropletAnimation:
             "resonance": False,
         }
 
-        self.droplets: List[Droplet] = []
-        self.droplets_lock = Lock()
+        # Live droplets stored as parallel arrays, the first _n slots are in use
+        self._dsrc = np.empty(MAX_DROPLETS, dtype=np.int64)  # Source pad
+        self._dage = np.empty(MAX_DROPLETS, dtype=np.float32)
+        self._dimpact = np.empty(MAX_DROPLETS, dtype=np.float32)
+        self._n = 0
+        self.dropped_droplets = 0  # Evicted to make room for new ones
         self.running = True
 
+        # Per-frame pad intensities, reused to avoid allocating every frame
+        self._out = np.zeros(64, dtype=np.float32)
+
+        # Droplets start on pad centres, so pad-to-pad distance and falloff
+        # only ever take 64x64 values
+        pts = np.array([(i % 16, i // 16) for i in range(64)], dtype=np.float32)
+        self._dist_lut = np.linalg.norm(pts[:, None, :] - pts[None, :, :], axis=2)
+        self._falloff_lut = np.exp(-self._dist_lut * 0.5)
+
+        # Last RGB sent to each pad, so frames only carry the pads that changed
+        self._last_colors = np.zeros((64, 3), dtype=np.uint8)
+
+        # Intensities behind the last rendered frame, to skip identical frames
+        self._prev_intensities = np.zeros(64, dtype=np.float32)
+
+        # Pad indices, first column of the packed pad payload
+        self._pad_idx = np.arange(64, dtype=np.uint8)
+
+        # Full-brightness RGB for the current hue; HSV with S=1 is linear in V
+        self._cached_hue = None
+        self._base_rgb = (0.0, 0.0, 0.0)
+
+        # Incoming MIDI is queued by the rtmidi callback and drained per frame
+        self._msg_q = queue.Queue(maxsize=256)
+        self.dropped_messages = 0  # Oldest input evicted from a full queue
+        self.midi_in.set_callback(self._on_midi)
+
+        # Clear all LEDs on startup
+        self.clear_all_leds()
+
     def clear_all_leds(self):
         """Clear all LEDs on the device"""
-        # Clear track LEDs (the narrow LEDs between solo buttons and pads)
-        for i in range(4):
-            control_change = 0x28 + i
-            self.midi_out.send_message([0xB0, control_change, 0])
-
-        # Clear transport buttons (PLAY, STOP, REC)
-        for button in [0x33, 0x34, 0x35]:
-            self.midi_out.send_message([0xB0, button, 0])
-
-        # Clear other function buttons
-        for button in [
-            0x2C,
-            0x2D,
-            0x2E,
-            0x2F,
-            0x30,
-            0x31,
-            0x32,
-        ]:  # STEP, NOTE, DRUM, etc.
-            self.midi_out.send_message([0xB0, button, 0])
-
-        # Clear pattern navigation buttons
-        for button in [0x1F, 0x20, 0x22, 0x23]:  # PAT UP/DOWN, GRID LEFT/RIGHT
-            self.midi_out.send_message([0xB0, button, 0])
-
-        # Clear solo buttons
-        for button in self.solo_buttons.keys():
-            self.midi_out.send_message([0xB0, button, 0])
+        # rtmidi only takes one short message per send, so pace the burst in
+        # groups of 8 to stay within what the device can parse
+        led_ccs = self.LED_CCS
+        for start in range(0, len(led_ccs), 8):
+            for cc in led_ccs[start : start + 8]:
+                self.midi_out.send_message([0xB0, cc, 0])
+            time.sleep(0.0005)
 
         # Clear all pads
         clear_colors = [(i, 0, 0, 0) for i in range(64)]
         self.midi_out.send_message(create_pad_sysex(clear_colors))
 
+        # The pads are dark again, forget what the last frame sent
+        self._last_colors.fill(0)
+        self._prev_intensities.fill(-1.0)  # Force the next frame out
+
     def handle_encoder_rotation(self, encoder_id: int, direction: str, velocity: int):
         """Handle rotary encoder movements with improved scaling"""
         # Increased base scaling for faster response
@@ -233,8 +323,8 @@ class DropletAnimation:
 
     def handle_solo_button(self, button_id: int, pressed: bool):
         """Handle solo button presses for debug lanes"""
-        if button_id in self.solo_buttons:
-            lane = self.solo_buttons[button_id]
+        lane = self.SOLO_BUTTONS.get(button_id)
+        if lane is not None:
             if pressed:
                 if lane in self.debug_lanes:
                     self.debug_lanes.remove(lane)
@@ -243,66 +333,65 @@ class DropletAnimation:
                     self.debug_lanes.add(lane)
                     print(f"Debug lane {lane} enabled")
 
-    def handle_midi_input(self):
-        """Thread function to handle MIDI input"""
-        while self.running:
-            msg = self.midi_in.get_message()
-            if msg:
-                message, _ = msg
-
-                # Handle pad presses
-                if message[0] == 0x90 and message[2] > 0:
-                    pad_index = message[1] - 54  # Akai Fire pad offset
-                    if 0 <= pad_index < 64:
-                        with self.droplets_lock:
-                            self.droplets.append(
-                                create_tap_droplet(pad_index, message[2])
-                            )
-
-                    # Handle solo buttons
-                    if message[1] in self.solo_buttons:
-                        self.handle_solo_button(message[1], True)
-
-                # Handle encoder controls
-                encoder_map = {
-                    0x10: "volume",
-                    0x11: "pan",
-                    0x12: "filter",
-                    0x13: "resonance",
-                }
-
-                if message[1] in encoder_map:
-                    if message[0] == 0x90:  # Touch start
-                        self.encoder_touched[encoder_map[message[1]]] = True
-                    elif message[0] == 0x80:  # Touch end
-                        self.encoder_touched[encoder_map[message[1]]] = False
-
-                if message[0] == 0xB0 and message[1] in encoder_map:
-                    value = message[2]
-                    direction = "clockwise" if value < 0x40 else "counterclockwise"
-                    velocity = value if value < 0x40 else (0x80 - value)
-                    self.handle_encoder_rotation(message[1], direction, velocity)
-
-                # if stop is pressed, clear screen
-                if message[0] == 0xB0 and message[1] == 0x34 and message[2] == 127:
-                    print("------ STOP PRESSED ------")
-                    self.clear_all_leds()
-
-            time.sleep(0.001)
-
-    def calculate_ripple_effect(self, distance, age, current_freq, current_decay):
-        """Calculate ripple effect with more pronounced parameters"""
-        # More pronounced frequency effect
-        wave = math.sin(distance * current_freq - age * 4)
-
-        # Sharper wave peaks
-        wave = math.pow(abs(wave), 0.7) * math.copysign(1, wave)
-
-        # Normalize and enhance contrast
-        ripple = wave * 0.5 + 0.5
-        ripple = math.pow(ripple, 0.8)  # Enhance contrast
-
-        return ripple
+    def add_droplet(self, pad_index: int, impact: float):
+        """Start a droplet on a pad, replacing the oldest one when full"""
+        if self._n >= MAX_DROPLETS:
+            # Live droplets are packed oldest first, so shift the oldest out
+            self._dsrc[:-1] = self._dsrc[1:]
+            self._dage[:-1] = self._dage[1:]
+            self._dimpact[:-1] = self._dimpact[1:]
+            self._n = MAX_DROPLETS - 1
+            self.dropped_droplets += 1
+        self._dsrc[self._n] = pad_index
+        self._dage[self._n] = 0.0
+        self._dimpact[self._n] = impact
+        self._n += 1
+
+    def _on_midi(self, event, data=None):
+        """rtmidi callback, queues the message for the render loop"""
+        message, _ = event
+        while True:
+            try:
+                self._msg_q.put_nowait(message)
+                return
+            except queue.Full:
+                # Evict the oldest message so the newest input still gets through
+                try:
+                    self._msg_q.get_nowait()
+                    self.dropped_messages += 1
+                except queue.Empty:
+                    pass
+
+    def _dispatch(self, message):
+        """Handle a single incoming MIDI message"""
+        # Handle pad presses
+        if message[0] == 0x90 and message[2] > 0:
+            pad_index = message[1] - 54  # Akai Fire pad offset
+            if 0 <= pad_index < 64:
+                self.add_droplet(pad_index, tap_impact(pad_index, message[2]))
+
+            # Handle solo buttons
+            if message[1] in self.SOLO_BUTTONS:
+                self.handle_solo_button(message[1], True)
+
+        # Handle encoder controls
+        encoder = self.ENCODER_MAP.get(message[1])
+        if encoder is not None:
+            if message[0] == 0x90:  # Touch start
+                self.encoder_touched[encoder] = True
+            elif message[0] == 0x80:  # Touch end
+                self.encoder_touched[encoder] = False
+
+        if message[0] == 0xB0 and encoder is not None:
+            value = message[2]
+            direction = "clockwise" if value < 0x40 else "counterclockwise"
+            velocity = value if value < 0x40 else (0x80 - value)
+            self.handle_encoder_rotation(message[1], direction, velocity)
+
+        # if stop is pressed, clear screen
+        if message[0] == 0xB0 and message[1] == 0x34 and message[2] == 127:
+            print("------ STOP PRESSED ------")
+            self.clear_all_leds()
 
     def run(self):
         try:
@@ -335,68 +424,101 @@ class DropletAnimation:
             print("- Harder taps create stronger ripples")
             print("- Use SOLO buttons to illuminate full lanes for debugging")
 
-            input_thread = Thread(target=self.handle_midi_input, daemon=True)
-            input_thread.start()
-
+            next_deadline = time.monotonic()
             while self.running:
+                # Handle MIDI input received since the last frame
+                while True:
+                    try:
+                        message = self._msg_q.get_nowait()
+                    except queue.Empty:
+                        break
+                    self._dispatch(message)
+
                 # Update smoothed values
                 current_freq = self.wave_frequency.update()
-                current_hue = self.color_hue.update()
+                current_hue = self.color_hue.update() % 1.0  # Glide may overshoot
                 current_radius = self.radius_multiplier.update()
                 current_decay = self.age_decay.update()
 
                 # Update existing droplets
-                pad_intensities = [[0.0] for _ in range(64)]
+                pad_intensities = self._out
+                pad_intensities.fill(0)
 
                 # Add debug lane illumination
                 for lane in self.debug_lanes:
-                    for col in range(16):
-                        pad_index = lane * 16 + col
-                        pad_intensities[pad_index][0] = 0.5
-
-                with self.droplets_lock:
-                    active_droplets = []
-                    for drop in self.droplets:
-                        drop.age += 0.1  # Fixed age increment
-                        drop.intensity = math.exp(-drop.age * current_decay)
-
-                        if drop.intensity > 0.05:
-                            active_droplets.append(drop)
-
-                            for row in range(4):
-                                for col in range(16):
-                                    pad_index = row * 16 + col
-                                    distance = math.sqrt(
-                                        (col - drop.x) ** 2 + (row - drop.y) ** 2
-                                    )
-
-                                    # Use wave_frequency for ripple animation
-                                    ripple = (
-                                        math.sin(distance * current_freq - drop.age * 4)
-                                        * 0.5
-                                        + 0.5
-                                    )
-                                    effect = (
-                                        drop.intensity
-                                        * drop.impact
-                                        * ripple
-                                        * math.exp(-distance * 0.5)
-                                    )
-
-                                    pad_intensities[pad_index][0] += effect
-
-                    self.droplets = active_droplets
+                    pad_intensities[lane * 16 : lane * 16 + 16] = 0.5
+
+                n = self._n
+                if n:
+                    ages = self._dage[:n]
+                    ages += 0.1  # Fixed age increment
+                    intensity = np.exp(-ages * current_decay)
+
+                    # Drop faded droplets, keeping the live ones packed at the front
+                    alive = intensity > 0.05
+                    src = self._dsrc[:n][alive]
+                    ages = ages[alive]
+                    impact = self._dimpact[:n][alive]
+                    self._n = n = src.size
+                    self._dsrc[:n] = src
+                    self._dage[:n] = ages
+                    self._dimpact[:n] = impact
+
+                    _ripple_kernel(
+                        src,
+                        ages,
+                        intensity[alive] * impact,
+                        current_freq,
+                        self._dist_lut,
+                        self._falloff_lut,
+                        pad_intensities,
+                    )
 
                 # Convert intensities to colors
-                pad_colors = []
-                for i in range(64):
-                    intensity = min(1.0, max(0.0, pad_intensities[i][0]))
-                    rgb = colorsys.hsv_to_rgb(current_hue, 1.0, intensity)
-                    r, g, b = [int(x * 127) for x in rgb]
-                    pad_colors.append((i, r, g, b))
-
-                self.midi_out.send_message(create_pad_sysex(pad_colors))
-                time.sleep(self.frame_rate)
+                hue_changed = (
+                    self._cached_hue is None
+                    or abs(current_hue - self._cached_hue) > 1e-4
+                )
+                if hue_changed:
+                    self._cached_hue = current_hue
+                    self._base_rgb = colorsys.hsv_to_rgb(current_hue, 1.0, 1.0)
+
+                # Same intensities and hue means the same pads, so skip the frame
+                if hue_changed or not np.array_equal(
+                    pad_intensities, self._prev_intensities
+                ):
+                    np.copyto(self._prev_intensities, pad_intensities)
+                    base_r, base_g, base_b = self._base_rgb
+
+                    intensity = np.clip(pad_intensities, 0.0, 1.0)
+                    colors = np.stack(
+                        [
+                            (intensity * (base_r * 127)).astype(np.uint8),
+                            (intensity * (base_g * 127)).astype(np.uint8),
+                            (intensity * (base_b * 127)).astype(np.uint8),
+                        ],
+                        axis=1,
+                    )
+                    pad_colors = np.column_stack([self._pad_idx, colors])
+
+                    # Only send the pads that changed, unless most of the frame did
+                    changed = (colors != self._last_colors).any(axis=1)
+                    n_changed = int(np.count_nonzero(changed))
+                    if n_changed > 48:
+                        payload = pad_colors.tobytes()
+                        self.midi_out.send_message(create_pad_sysex_bytes(payload))
+                    elif n_changed:
+                        payload = pad_colors[changed].tobytes()
+                        self.midi_out.send_message(create_pad_sysex_bytes(payload))
+                    self._last_colors = colors
+
+                # Sleep until the next frame deadline so render time doesn't drift
+                next_deadline += self.frame_rate
+                sleep_for = next_deadline - time.monotonic()
+                if sleep_for > 0:
+                    time.sleep(sleep_for)
+                else:
+                    next_deadline = time.monotonic()  # Resync after an overrun
 
         except KeyboardInterrupt:
             print("\nInterrupted by user")
@@ -405,6 +527,9 @@ class DropletAnimation:
 
     def cleanup(self):
         self.running = False
+        print(f"Dropped droplets: {self.dropped_droplets}")
+        print(f"Dropped MIDI messages: {self.dropped_messages}")
+        self.midi_in.cancel_callback()
         clear_colors = [(i, 0, 0, 0) for i in range(64)]
         self.midi_out.send_message(create_pad_sysex(clear_colors))
         self.midi_out.close_port()
@@ -1,42 +1,94 @@
 import math
 import random
 import time
-from dataclasses import dataclass
-from typing import List
+from threading import Lock
 
-from akai_fire import AkaiFire
+import numpy as np
+from numba import njit
 
+from akai_fire import AkaiFire
 
-@dataclass
-class Droplet:
-    x: float
-    y: float
-    age: float
-    intensity: float
-    impact: float
+# Capacity of the droplet arrays
+MAX_DROPLETS = 128
+
+# exp(-distance * 0.5) sampled over the pad grid's distance range [0, 20]
+_EXPFALL = np.exp(-np.linspace(0, 20, 4096) * 0.5).astype(np.float32)
+
+
+@njit(cache=True, fastmath=True)
+def _fast_sin(x):
+    """Polynomial sine, plenty accurate for pad brightness (error < 2e-4)."""
+    # Reduce to [-pi, pi], then fold onto [-pi/2, pi/2]
+    x -= round(x * 0.15915494) * 6.2831853
+    if x > 1.5707963:
+        x = 3.1415927 - x
+    elif x < -1.5707963:
+        x = -3.1415927 - x
+    x2 = x * x
+    return x * (1.0 + x2 * (-0.16605 + x2 * 0.00761))
+
+
+@njit(cache=True, fastmath=True)
+def _ripple_kernel(xs, ys, ages, strength, expfall, out):
+    """Accumulate the ripple of every droplet into the 64 pad intensities."""
+    for d in range(xs.size):
+        phase = ages[d] * 4.0
+        for row in range(4):
+            for col in range(16):
+                dx = col - xs[d]
+                dy = row - ys[d]
+                distance = math.sqrt(dx * dx + dy * dy)
+                ripple = _fast_sin(distance * 2 - phase) * 0.5 + 0.5
+                falloff = expfall[int(distance * 204.75)]
+                out[row * 16 + col] += strength[d] * ripple * falloff
 
 
 class DropletAnimationStandard:
     def __init__(self):
         self.fire = AkaiFire()
-        self.droplets: List[Droplet] = []
+        # Live droplets stored as parallel arrays, the first _n slots are in use
+        self._dx = np.empty(MAX_DROPLETS, dtype=np.float32)
+        self._dy = np.empty(MAX_DROPLETS, dtype=np.float32)
+        self._dage = np.empty(MAX_DROPLETS, dtype=np.float32)
+        self._dimpact = np.empty(MAX_DROPLETS, dtype=np.float32)
+        self._n = 0
+        self.dropped_droplets = 0  # Evicted to make room for new ones
+        self.droplets_lock = Lock()
         self.running = True
 
+        # Per-frame pad intensities, reused to avoid allocating every frame
+        self._out = np.zeros(64, dtype=np.float32)
+
         # Set up pad press listener
         self.fire.add_global_listener(self.on_pad_pressed)
 
+    def add_droplet(self, x: float, y: float, impact: float):
+        """Start a droplet, replacing the oldest one when full"""
+        with self.droplets_lock:
+            if self._n >= MAX_DROPLETS:
+                # Live droplets are packed oldest first, so shift the oldest out
+                for column in (self._dx, self._dy, self._dage, self._dimpact):
+                    column[:-1] = column[1:]
+                self._n = MAX_DROPLETS - 1
+                self.dropped_droplets += 1
+            self._dx[self._n] = x
+            self._dy[self._n] = y
+            self._dage[self._n] = 0.0
+            self._dimpact[self._n] = impact
+            self._n += 1
+
     def on_pad_pressed(self, pad_index):
         """Handle pad press events"""
         x = pad_index % 16
         y = pad_index // 16
         # Create stronger ripple for user interactions
-        self.droplets.append(Droplet(x=x, y=y, age=0, intensity=1.0, impact=2.0))
+        self.add_droplet(x, y, 2.0)
 
     def create_random_droplet(self):
         """Create ambient background ripples"""
         x = random.uniform(0, 15)
         y = random.uniform(0, 3)
-        return Droplet(x=x, y=y, age=0, intensity=1.0, impact=0.5)
+        self.add_droplet(x, y, 0.5)
 
     def run(self):
         try:
@@ -47,52 +99,57 @@ class DropletAnimationStandard:
             self.fire.clear_all_pads()
 
             frame = 0
+            next_deadline = time.monotonic()
             while self.running:
                 # Add random ambient droplets
                 if random.random() < 0.02:
-                    self.droplets.append(self.create_random_droplet())
+                    self.create_random_droplet()
 
                 # Update all droplets
-                active_droplets = []
-                pad_intensities = [[0.0] for _ in range(64)]
-
-                for drop in self.droplets:
-                    drop.age += 0.1
-                    drop.intensity = math.exp(-drop.age * 0.4)
-
-                    if drop.intensity > 0.05:
-                        active_droplets.append(drop)
-
+                pad_intensities = self._out
+                pad_intensities.fill(0)
+
+                with self.droplets_lock:
+                    n = self._n
+                    ages = self._dage[:n]
+                    ages += 0.1
+                    intensity = np.exp(-ages * 0.4)
+
+                    # Drop faded droplets, keeping the live ones packed at the front
+                    keep = intensity > 0.05
+                    self._n = n = int(np.count_nonzero(keep))
+                    np.copyto(self._dx[:n], self._dx[: keep.size][keep])
+                    np.copyto(self._dy[:n], self._dy[: keep.size][keep])
+                    np.copyto(self._dage[:n], ages[keep])
+                    np.copyto(self._dimpact[:n], self._dimpact[: keep.size][keep])
+                    strength = intensity[keep] * self._dimpact[:n]
+
+                    if n:
                         # Calculate effect on all pads
-                        for row in range(4):
-                            for col in range(16):
-                                pad_index = row * 16 + col
-                                distance = math.sqrt(
-                                    (col - drop.x) ** 2 + (row - drop.y) ** 2
-                                )
-
-                                # Ripple wave effect
-                                ripple = (
-                                    math.sin(distance * 2 - drop.age * 4) * 0.5 + 0.5
-                                )
-                                effect = (
-                                    drop.intensity
-                                    * drop.impact
-                                    * ripple
-                                    * math.exp(-distance * 0.5)
-                                )
-
-                                pad_intensities[pad_index][0] += effect
-
-                self.droplets = active_droplets
+                        _ripple_kernel(
+                            self._dx[:n],
+                            self._dy[:n],
+                            self._dage[:n],
+                            strength,
+                            _EXPFALL,
+                            pad_intensities,
+                        )
+
+                # Blue with hint of cyan
+                blue = np.clip(pad_intensities * 127, 0, 127).astype(np.uint8)
+                green = (blue * 0.2).astype(np.uint8)
 
                 # Update pad colors individually
-                for i in range(64):
-                    intensity = min(127, max(0, int(pad_intensities[i][0] * 127)))
-                    # Blue with hint of cyan
-                    self.fire.set_pad_color(i, 0, int(intensity * 0.2), intensity)
-
-                time.sleep(0.03)
+                for i, (g, b) in enumerate(zip(green.tolist(), blue.tolist())):
+                    self.fire.set_pad_color(i, 0, g, b)
+
+                # Sleep until the next frame deadline so render time doesn't drift
+                next_deadline += 0.03
+                sleep_for = next_deadline - time.monotonic()
+                if sleep_for > 0:
+                    time.sleep(sleep_for)
+                else:
+                    next_deadline = time.monotonic()  # Resync after an overrun
                 frame += 1
 
         except KeyboardInterrupt:
@@ -102,6 +159,7 @@ class DropletAnimationStandard:
 
     def cleanup(self):
         self.running = False
+        print(f"Dropped droplets: {self.dropped_droplets}")
         self.fire.clear_all_pads()
         self.fire.clear_all_button_leds()
         self.fire.close()